@@ -5,19 +5,19 @@ EXCLUDE_DIRS = {'.git', '.github', '.vscode', '__pycache__', '.venv', 'env', 've
 EXCLUDE_FILES = {'.gitignore', 'README.md', 'requirements.txt'}
 
 def list_project_structure(start_path, indent=0):
-    items = sorted(os.listdir(start_path))
-    for item in items:
-        item_path = os.path.join(start_path, item)
-
+    # scandir entries carry their type, so is_file/is_dir don't stat each path again
+    with os.scandir(start_path) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    for entry in entries:
         # Skip excluded dirs and files
-        if item in EXCLUDE_DIRS:
+        if entry.name in EXCLUDE_DIRS:
             continue
-        if os.path.isfile(item_path) and item in EXCLUDE_FILES:
+        if entry.name in EXCLUDE_FILES and entry.is_file():
             continue
 
-        print('    ' * indent + '├── ' + item)
-        if os.path.isdir(item_path):
-            list_project_structure(item_path, indent + 1)
+        print('    ' * indent + '├── ' + entry.name)
+        if entry.is_dir():
+            list_project_structure(entry.path, indent + 1)
 
 # Start from the root of your project
 project_root = os.getcwd()  # or set manually: "/path/to/your/project"
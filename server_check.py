@@ -2,12 +2,19 @@ import os
 import datetime
 import ping3
 import openpyxl
-import schedule
 import time
 import subprocess
 import platform
+import socket
+import queue
+import threading
 import requests
-from openpyxl.utils import get_column_letter
+from dataclasses import dataclass
+from typing import Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from openpyxl.cell import Cell
 from openpyxl.styles import PatternFill
 
 # Configuration: Your servers list
@@ -27,32 +34,99 @@ LOG_DIR = "server_logs"
 if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
 
+# Resolve a server address once at startup, so pings never wait on DNS; falls back to the name if it can't be resolved now
+def resolve_address(address):
+    try:
+        return socket.getaddrinfo(address, None)[0][4][0]
+    except socket.gaierror as e:
+        print(f"⚠️ Could not resolve {address} at startup ({e}); it will be looked up on each ping")
+        return address
+
+# (tracker key, display name, configured ip or hostname, resolved address to ping) for each server, extracted once
+server_entries = [
+    (next(iter(server)), server[next(iter(server))], server["ip"], resolve_address(server["ip"]))
+    for server in servers
+]
+
+# Seconds between status checks
+CHECK_INTERVAL = 300
+
+# Unchanged servers still get a row this often, so the sheet shows the monitor is alive
+HEARTBEAT_INTERVAL = datetime.timedelta(hours=1)
+
+# Per-server state between checks
+@dataclass(slots=True)
+class Tracker:
+    last_status: Optional[str] = None
+    last_down_time: Optional[datetime.datetime] = None
+    last_up_time: Optional[datetime.datetime] = None
+    last_logged: Optional[datetime.datetime] = None
+    notification_sent: bool = False
+
 # Track server state
-server_status_tracker = {
-    server[next(iter(server))]: {
-        "last_status": None,
-        "last_down_time": None,
-        "last_up_time": None,
-        "notification_sent": False
-    } for server in servers
-}
+server_status_tracker = {server_key: Tracker() for server_key, _, _, _ in server_entries}
+
+# Every server logs to one sheet; filter by the Server Name column to see a single server
+LOG_SHEET = "Log"
+LOG_HEADERS = ["Date & Time", "Server Name", "Server IP", "Server Status", "Last Down Time", "Last Up Time", "Downtime Duration (Min)"]
+
+# Today's workbook and its log sheet, kept open between runs so they are only set up once per day
+workbook_cache = {"filename": None, "workbook": None, "sheet": None}
+
+# Status cell fills, created once
+red_fill = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
+green_fill = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
 
 def get_excel_filename():
     current_date = datetime.datetime.now().strftime("%Y-%m-%d")
     return os.path.join(LOG_DIR, f"server_status_{current_date}.xlsx")
 
+def get_workbook():
+    excel_file = get_excel_filename()
+    if workbook_cache["filename"] != excel_file:
+        try:
+            workbook = openpyxl.load_workbook(excel_file)
+        except Exception:
+            print(f"Creating new workbook: {excel_file}")
+            workbook = openpyxl.Workbook()
+            if "Sheet" in workbook.sheetnames:
+                workbook.remove(workbook["Sheet"])
+        workbook_cache["filename"] = excel_file
+        workbook_cache["workbook"] = workbook
+        if LOG_SHEET in workbook.sheetnames:
+            sheet = workbook[LOG_SHEET]
+        else:
+            sheet = workbook.create_sheet(LOG_SHEET)
+            sheet.append(LOG_HEADERS)
+        workbook_cache["sheet"] = sheet
+    return workbook_cache["workbook"], workbook_cache["sheet"], excel_file
+
+# System ping command for a single echo, resolved once; -n on Unix skips the reverse DNS lookup of the reply
+PING_COMMAND = ['ping', '-n', '1'] if platform.system().lower() == 'windows' else ['ping', '-n', '-c', '1']
+
+# Seconds to wait before each retry of a failed ping (backs off, short enough to keep the sweep quick)
+PING_RETRY_DELAYS = (1, 2)
+
+# Switched on the first time ping3 can't open an ICMP socket; from then on only the system ping is used
+use_system_ping = False
+
 def ping_server(ip):
     def try_ping():
+        global use_system_ping
+        if not use_system_ping:
+            try:
+                response_time = ping3.ping(ip, timeout=5)
+                if response_time is not None and response_time is not False:
+                    print(f"Ping3 success for {ip}: {response_time}ms")
+                    return True
+                return False  # No reply (None) or unreachable (False); the host is down, no need to fork a second ping
+            except PermissionError as e:
+                print(f"Ping3 can't open an ICMP socket ({e}); using system ping from now on")
+                use_system_ping = True
+            except Exception as e:
+                print(f"Ping3 error for {ip}: {e}")
         try:
-            response_time = ping3.ping(ip, timeout=5)
-            if response_time is not None:
-                print(f"Ping3 success for {ip}: {response_time}ms")
-                return True
-        except Exception as e:
-            print(f"Ping3 error for {ip}: {e}")
-        try:
-            param = '-n' if platform.system().lower() == 'windows' else '-c'
-            result = subprocess.run(['ping', param, '1', ip], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=10)
+            result = subprocess.run([*PING_COMMAND, ip], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=10)
             return result.returncode == 0
         except Exception as e:
             print(f"System ping error for {ip}: {e}")
@@ -60,95 +134,114 @@ def ping_server(ip):
 
     if try_ping():
         return "Up"
-    print(f"Initial ping failed for {ip}, waiting 120 seconds...")
-    time.sleep(120)
-    if try_ping():
-        return "Up"
+    for delay in PING_RETRY_DELAYS:
+        print(f"Ping failed for {ip}, retrying in {delay} seconds...")
+        time.sleep(delay)
+        if try_ping():
+            return "Up"
     return "Down"
 
-def initialize_excel_sheet(workbook, sheet_name):
-    sheet_name = sheet_name.replace("/", "_").replace("\\", "_").replace(":", "_")
-    if sheet_name not in workbook.sheetnames:
-        sheet = workbook.create_sheet(sheet_name)
-        headers = ["Date & Time", "Server IP", "Server Status", "Last Down Time", "Last Up Time", "Downtime Duration (Min)"]
-        for col_num, header in enumerate(headers, 1):
-            sheet[f"{get_column_letter(col_num)}1"] = header
-    return workbook[sheet_name]
+# Ping every server concurrently so a host waiting out its retry doesn't hold up the rest
+def gather_statuses():
+    with ThreadPoolExecutor(max_workers=len(servers)) as executor:
+        return list(executor.map(lambda entry: ping_server(entry[3]), server_entries))
 
-def send_whatsapp_alert(number, message):
-    try:
-        res = requests.post("http://localhost:3000/send", json={
-            "number": number,
-            "message": message
-        })
-        if res.status_code == 200:
-            print("✅ WhatsApp alert sent.")
-        else:
-            print(f"❌ WhatsApp alert failed: {res.text}")
-    except Exception as e:
-        print(f"❌ Error sending WhatsApp alert: {e}")
+# Alerts are sent by this many background threads, so several alerts from one check go out together
+ALERT_WORKERS = 2
+
+# Shared session so alerts reuse keep-alive connections to the local WhatsApp service (one per worker)
+whatsapp_session = requests.Session()
+whatsapp_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=ALERT_WORKERS, max_retries=Retry(total=2, backoff_factor=0.3)))
+
+# At most one alert per server in this many seconds
+ALERT_COOLDOWN = 1800
+
+# Alerts are sent in the background so a slow WhatsApp service never holds up the status check
+alert_queue = queue.Queue()
+alert_last_sent = {}
+
+def alert_worker():
+    while True:
+        number, message = alert_queue.get()
+        try:
+            res = whatsapp_session.post("http://localhost:3000/send", json={
+                "number": number,
+                "message": message
+            }, timeout=(0.5, 10))
+            if res.status_code == 200:
+                print("✅ WhatsApp alert sent.")
+            else:
+                print(f"❌ WhatsApp alert failed: {res.text}")
+        except Exception as e:
+            print(f"❌ Error sending WhatsApp alert: {e}")
+
+for worker_num in range(ALERT_WORKERS):
+    threading.Thread(target=alert_worker, name=f"whatsapp-alerts-{worker_num}", daemon=True).start()
+
+# Called from the status check only, so the cooldown bookkeeping needs no lock; returns whether the alert was queued
+def send_whatsapp_alert(number, message, host_key):
+    now = time.monotonic()
+    if host_key in alert_last_sent and now - alert_last_sent[host_key] < ALERT_COOLDOWN:
+        print(f"Skipping WhatsApp alert for {host_key}: one was sent less than {ALERT_COOLDOWN // 60} min ago")
+        return False
+    alert_last_sent[host_key] = now
+    alert_queue.put((number, message))
+    return True
 
 def log_server_status():
     print("Servers configuration:", servers)
-    excel_file = get_excel_filename()
+    workbook, sheet, excel_file = get_workbook()
 
-    try:
-        workbook = openpyxl.load_workbook(excel_file)
-    except Exception:
-        print(f"Creating new workbook: {excel_file}")
-        workbook = openpyxl.Workbook()
-        if "Sheet" in workbook.sheetnames:
-            workbook.remove(workbook["Sheet"])
-
-    current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    current_time_dt = datetime.datetime.now().replace(microsecond=0)
+    current_time = current_time_dt.strftime("%Y-%m-%d %H:%M:%S")
     data_logged = False
 
-    red_fill = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-    green_fill = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
+    statuses = gather_statuses()
 
-    for server in servers:
-        server_key = next(iter(server))
-        server_name = server[server_key]
-        ip = server["ip"]
-        status = ping_server(ip)
+    for (server_key, server_name, ip, _), status in zip(server_entries, statuses):
         down_time = ""
         up_time = ""
         duration = ""
 
-        current_time_dt = datetime.datetime.strptime(current_time, "%Y-%m-%d %H:%M:%S")
         tracker = server_status_tracker[server_key]
-        last_status = tracker["last_status"]
+        last_status = tracker.last_status
+        changed = status != last_status
 
-        if status == "Down" and not tracker["notification_sent"]:
+        if status == "Down" and not tracker.notification_sent:
             message = f"🚨 Server Down Alert 🚨\nServer: {server_name}\nIP: {ip}\nTime: {current_time}"
-            send_whatsapp_alert("8328618110", message)  # Replace with real number
-            tracker["notification_sent"] = True
+            # Still down after a cooldown skip: retried on the next check until an alert goes out
+            tracker.notification_sent = send_whatsapp_alert("8328618110", message, server_key)  # Replace with real number
 
         elif status == "Up":
             if last_status == "Down":
-                tracker["last_up_time"] = current_time_dt
+                tracker.last_up_time = current_time_dt
                 up_time = current_time
-                if tracker["last_down_time"]:
-                    duration_dt = current_time_dt - tracker["last_down_time"] 
+                if tracker.last_down_time:
+                    duration_dt = current_time_dt - tracker.last_down_time 
                     duration = round(duration_dt.total_seconds() / 60, 2)
-                    tracker["last_down_time"] = None
-                tracker["notification_sent"] = False
-            if tracker["last_up_time"]:
-                up_time = tracker["last_up_time"].strftime("%Y-%m-%d %H:%M:%S")
+                    tracker.last_down_time = None
+                tracker.notification_sent = False
+            if tracker.last_up_time:
+                up_time = tracker.last_up_time.strftime("%Y-%m-%d %H:%M:%S")
 
         if status == "Down" and last_status != "Down":
-            tracker["last_down_time"] = current_time_dt
+            tracker.last_down_time = current_time_dt
 
-        tracker["last_status"] = status
+        tracker.last_status = status
 
-        sheet = initialize_excel_sheet(workbook, server_name)
-        row = [current_time, ip, status, down_time, up_time, duration]
+        # Only write transitions plus an hourly heartbeat; repeats of the same status are skipped
+        last_logged = tracker.last_logged
+        if not changed and last_logged and current_time_dt - last_logged < HEARTBEAT_INTERVAL:
+            continue
+        tracker.last_logged = current_time_dt
+
+        # Status cell carries its fill into append, so there's no max_row scan or second write afterwards
+        status_cell = Cell(sheet, value=status)
+        status_cell.fill = red_fill if status == "Down" else green_fill
+        row = [current_time, server_name, ip, status_cell, down_time, up_time, duration]
         sheet.append(row)
         data_logged = True
 
-        status_cell = f"C{sheet.max_row}"
-        sheet[status_cell].fill = red_fill if status == "Down" else green_fill
-
         if status == "Down":
             print(f"Logged: {server_name} ({ip}) - Down at {current_time}")
         else:
@@ -156,6 +249,7 @@ def log_server_status():
 
     if data_logged:
         try:
+            sheet.auto_filter.ref = sheet.dimensions
             workbook.save(excel_file)
             print(f"Saved log to {excel_file}\n")
         except Exception as e:
@@ -164,14 +258,15 @@ def log_server_status():
         print("No new data to log.")
 
 def main():
-    schedule.every(5).minutes.do(log_server_status)
     print("🔍 Server status monitoring started...\n")
-    log_server_status()
+    next_run = time.monotonic()
 
     while True:
         try:
-            schedule.run_pending()
-            time.sleep(1)
+            log_server_status()
+            # Sleep straight to the next deadline instead of waking every second; never schedule in the past
+            next_run = max(next_run + CHECK_INTERVAL, time.monotonic())
+            time.sleep(max(0, next_run - time.monotonic()))
         except KeyboardInterrupt:
             print("⛔ Monitoring stopped by user.")
             break
@@ -0,0 +1,698 @@
+# Shared implementation of the Shinobi Monitoring System; Shinobi.py and shinobi_optimal.py are entry points that run main()
+
+# Import required libraries for the Shinobi Monitoring System
+import os  # For file and directory operations (e.g., checking .env file, creating output directory)
+import sys  # For system-specific functions (e.g., exiting on import errors)
+import time  # For timing operations (e.g., sleep intervals, timestamps)
+import signal  # For handling shutdown signals (e.g., Ctrl+C, SIGTERM)
+import queue  # For handing log records to the background logging thread
+import atexit  # For stopping the background logging thread on exit
+import threading  # For running metric file cleanup off the main loop
+import logging  # For logging script activity to console and file
+from datetime import datetime  # For generating timestamps in local timezone
+from dataclasses import dataclass  # For lightweight per-monitor status records
+from typing import Optional, List, Dict, Any, Tuple  # For type hints to improve code clarity
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener  # For log rotation and background log writing
+
+# Import third-party dependencies, exiting with an install hint if any are missing
+try:
+    import orjson  # For fast JSON serialization of log records and metric files
+    import requests  # For making HTTP requests to Shinobi API
+    from requests.adapters import HTTPAdapter  # For configuring retry behavior in HTTP requests
+    from urllib3.util.retry import Retry  # For retry logic on HTTP requests
+    import gspread  # For interacting with Google Sheets API
+    from gspread import Client, Worksheet  # For specific Google Sheets client and worksheet types
+    from google.oauth2.service_account import Credentials as ServiceAccountCredentials  # For Google Sheets authentication (refreshed in place by gspread)
+    from pydantic import Field, ValidationError, PrivateAttr, field_validator  # For structured configuration validation
+    from pydantic_settings import BaseSettings, SettingsConfigDict  # For loading configuration from environment variables and .env file
+    import pytz  # For handling timezone conversions (e.g., Asia/Kolkata)
+    from tenacity import retry, Retrying, stop_after_attempt, wait_exponential, wait_random, retry_if_exception_type, before_sleep_log  # For retrying failed operations with exponential backoff
+except ImportError as e:
+    print(f"Error: Missing required package: {e.name}. Install with 'pip install requests python-dotenv gspread google-auth pydantic pydantic-settings pytz tenacity orjson'")
+    sys.exit(1)  # Exit script if dependencies are missing
+
+# Define configuration model using Pydantic Settings; values are read from the environment and .env file
+class Config(BaseSettings):
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore", frozen=True)  # Settings are read-only after load
+
+    shinobi_host: str = Field(min_length=1)  # Shinobi server hostname (e.g., localhost)
+    shinobi_port: int = Field(gt=0, le=65535)  # Shinobi server port (e.g., 8080)
+    api_key: str = Field(min_length=1, validation_alias="SHINOBI_API_KEY")  # Shinobi API key for authentication
+    group_key: str = Field(min_length=1, validation_alias="SHINOBI_GROUP_KEY")  # Shinobi group key to filter monitors
+    monitor_ids: Tuple[str, ...]  # Monitor IDs to track (JSON list in the environment), kept immutable
+    sheet_id: str = Field(min_length=1)  # Google Sheet ID for storing metrics
+    credentials_file: str = Field(min_length=1)  # Path to Google Sheets service account credentials JSON
+    scopes: Tuple[str, ...]  # Google API scopes for authentication (JSON list in the environment), kept immutable
+    output_dir: str = Field(min_length=1)  # Directory to save JSON metric files
+    update_interval: float = Field(gt=0)  # Interval (seconds) between metric updates
+    max_retries: int = Field(ge=0)  # Maximum retries for API requests
+    retry_backoff_factor: float = Field(ge=0)  # Backoff factor for retry delays
+    timezone: str = "Asia/Kolkata"  # Timezone for timestamps (e.g., Asia/Kolkata)
+    max_consecutive_failures: int = Field(default=5, gt=0)  # Max consecutive API failures before exiting
+    log_retention_days: int = Field(default=7, gt=0)  # Days to retain JSON metric files
+    apps_script_url: str = ""  # URL for Apps Script to send server-down notifications (empty disables them)
+    notification_cooldown: int = Field(default=3600, ge=0)  # Cooldown (seconds) between server-down notifications
+    sheets_batch_size: int = Field(default=5, gt=0)  # Number of queued rows that triggers a Google Sheets write
+    sheets_flush_interval: float = Field(default=300.0, gt=0)  # Max seconds queued rows wait before being written to Google Sheets
+    unchanged_write_interval: float = Field(default=300.0, ge=0)  # Seconds between file/Sheets writes while monitor states are unchanged (0 = every poll)
+    _tz: Any = PrivateAttr(default=None)  # Timezone object resolved once after validation
+    _monitor_id_set: frozenset = PrivateAttr(default=frozenset())  # Monitor IDs as a set for O(1) membership tests
+
+    # Reject unknown timezone names at load time
+    @field_validator("timezone")
+    @classmethod
+    def _validate_timezone(cls, value: str) -> str:
+        try:
+            pytz.timezone(value)
+        except pytz.exceptions.UnknownTimeZoneError:
+            raise ValueError(f"Invalid timezone: {value}")
+        return value
+
+    # Cache derived lookups once so callers don't rebuild them per cycle
+    def model_post_init(self, __context: Any) -> None:
+        self._tz = pytz.timezone(self.timezone)
+        self._monitor_id_set = frozenset(self.monitor_ids)
+
+MODE_RECORD = "record"  # Shinobi monitor mode for cameras that are recording
+STATUS_RECORDING = "Recording"  # Shinobi monitor status for cameras that are recording
+
+CLEANUP_INTERVAL = 3600  # Seconds between scans of output_dir for expired metric files
+
+STDOUT_IS_TTY = sys.stdout is not None and sys.stdout.isatty()  # Console report is only printed for an interactive terminal
+
+# Attributes every LogRecord has; anything else was passed through extra= and goes into the JSON output
+_LOG_RECORD_ATTRS = frozenset(logging.LogRecord("", 0, "", 0, "", None, None).__dict__) | {"message", "asctime"}
+
+# Custom log formatter to output logs in JSON format for structured logging
+class JsonFormatter(logging.Formatter):
+    def __init__(self, timezone: str):
+        super().__init__()
+        self.tz = pytz.timezone(timezone)  # Resolve timezone once for all log timestamps
+        self._last_sec = None  # Whole second of the cached timestamp prefix
+        self._last_prefix = ""  # "YYYY-MM-DDTHH:MM:SS" for _last_sec in self.tz
+        self._last_offset = ""  # UTC offset suffix (e.g. "+05:30") for _last_sec
+
+    # Build an ISO 8601 timestamp from the record's creation time, reusing the per-second prefix
+    def _timestamp(self, created: float) -> str:
+        sec = int(created)
+        if sec != self._last_sec:
+            local = datetime.fromtimestamp(sec, self.tz)
+            iso = local.isoformat()
+            self._last_sec = sec
+            self._last_prefix = iso[:19]
+            self._last_offset = iso[19:]
+        return f"{self._last_prefix}.{int((created - sec) * 1e6):06d}{self._last_offset}"
+
+    def format(self, record):
+        # Format log record as JSON with timestamp, level, message, module, and line number
+        log_record = {
+            "timestamp": self._timestamp(record.created),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno
+        }
+        for key in record.__dict__.keys() - _LOG_RECORD_ATTRS:  # Fields passed via extra=, e.g. a monitor's status
+            log_record[key] = record.__dict__[key]
+        return orjson.dumps(log_record).decode()
+
+# Background listener that writes queued log records to the console and file handlers
+_log_listener: Optional[QueueListener] = None
+
+# Stop the background log listener, flushing any queued records
+def _stop_log_listener() -> None:
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+atexit.register(_stop_log_listener)  # Drain pending log records on interpreter exit
+
+# Set up logging to console (INFO and above) and file (DEBUG and above) with rotation
+def setup_logging(timezone: str) -> logging.Logger:
+    global _log_listener
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+    logger.handlers.clear()  # Clear any existing handlers to avoid duplicates
+    _stop_log_listener()  # Stop the listener from a previous setup before replacing it
+    handlers: List[logging.Handler] = []
+    
+    # Console handler: Outputs INFO and higher to stdout
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setLevel(logging.INFO)
+    console_handler.setFormatter(JsonFormatter(timezone))
+    handlers.append(console_handler)
+    
+    # File handler: Outputs DEBUG and higher to rotating log file (5 MB, 5 backups)
+    try:
+        file_handler = RotatingFileHandler(
+            "shinobi_monitor.log",
+            maxBytes=5*1024*1024,  # 5 MB per file
+            backupCount=5  # Keep 5 backup files
+        )
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(JsonFormatter(timezone))
+        handlers.append(file_handler)
+    except Exception as e:
+        print(f"Warning: Failed to set up file logging: {e}")
+    
+    # Log calls only enqueue records; formatting and I/O happen on the listener thread
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(log_queue))
+    _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+    
+    logger.propagate = False  # Prevent logs from propagating to parent loggers
+    return logger
+
+# Load configuration from .env file and validate using Pydantic
+def load_config(env_path: str = ".env") -> Config:
+    logger = setup_logging("Asia/Kolkata")  # Initialize logger with default timezone
+    logger.info("Loading configuration from .env")
+    if not os.path.exists(env_path):
+        logger.error(".env file not found at %s", env_path)
+        raise FileNotFoundError(f".env file not found at {env_path}")
+
+    try:
+        config = Config(_env_file=env_path)  # Read and validate all settings in one pass
+        logger.info("Configuration loaded successfully")
+        return config
+    except ValidationError as e:
+        logger.error("Configuration error: %s", e)
+        raise
+
+# Class to trigger Google Apps Script for server-down notifications
+class AppsScriptNotifier:
+    def __init__(self, config: Config, logger: logging.Logger):
+        self.config = config
+        self.logger = logger
+        self.session = self._create_session()  # Reuse one keep-alive connection across notifications
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)  # Notifications go to a single host, one at a time
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    # Send a notification message to the Apps Script endpoint
+    def trigger(self, message: str) -> bool:
+        if not self.config.apps_script_url:
+            self.logger.warning("Apps Script URL not configured; skipping notification")
+            return False  # Skip if no URL is provided
+        
+        try:
+            payload = {"message": message}  # Prepare notification payload
+            response = self.session.post(self.config.apps_script_url, json=payload, timeout=10)
+            response.raise_for_status()  # Raise exception for HTTP errors
+            self.logger.info("Successfully triggered Apps Script: %s", response.text)
+            return True
+        except requests.RequestException as e:
+            self.logger.error("Failed to trigger Apps Script: %s", e)
+            return False
+
+# Class to interact with Shinobi API
+class ShinobiAPI:
+    def __init__(self, config: Config, logger: logging.Logger):
+        self.config = config
+        self.logger = logger
+        self.base_url = f"http://{config.shinobi_host}:{config.shinobi_port}/{config.api_key}"  # Base URL for API requests
+        self._monitors_url = f"{self.base_url}/monitor/{config.group_key}"  # Monitor list URL, built once
+        self.session = self._create_session()  # Initialize HTTP session with retries
+        # Monitor list request prepared once; each poll sends it as-is instead of re-parsing the URL and merging settings
+        self._monitors_request = self.session.prepare_request(requests.Request("GET", self._monitors_url))
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        retries = Retry(
+            total=self.config.max_retries,
+            backoff_factor=self.config.retry_backoff_factor,
+            status_forcelist=[429, 500, 502, 503, 504],  # Retry on specific HTTP errors
+            raise_on_status=False  # Hand the final response back so its status code is reported
+        )
+        adapter = HTTPAdapter(max_retries=retries, pool_connections=1, pool_maxsize=1)  # Single-threaded client for one host; keep one reusable connection
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    # Fetch the monitor list once and classify server health from the same response; retries are handled by the session's urllib3 Retry adapter
+    def poll(self) -> Tuple[str, Optional[List[Dict[str, Any]]]]:
+        try:
+            resp = self.session.send(self._monitors_request, timeout=10)
+            if resp.status_code >= 400:  # Checked inline rather than building and catching an HTTPError
+                self.logger.warning("Shinobi server health check failed: HTTP %s", resp.status_code)
+                return "ERROR", None
+            data = orjson.loads(resp.content)  # Parse raw bytes without decoding to str first
+            if isinstance(data, dict) and not data.get("ok"):
+                self.logger.warning("Shinobi server responded but with error: %s", data.get('msg', 'Unknown error'))
+                return "INVALID_RESPONSE", None
+            self.logger.debug("Shinobi server health check: OK")
+            return "OK", data
+        except requests.ConnectionError:
+            self.logger.warning("Shinobi server is unreachable (connection error)")
+            return "UNREACHABLE", None
+        except requests.Timeout:
+            self.logger.warning("Shinobi server health check timed out")
+            return "TIMEOUT", None
+        except (requests.RequestException, orjson.JSONDecodeError) as e:
+            self.logger.warning("Shinobi server health check failed: %s", e)
+            return "ERROR", None
+
+_WRITER_STOP = object()  # Sentinel telling the Sheets writer thread to flush and exit
+SHEETS_MAX_PENDING_ROWS = 1000  # Rows kept for Google Sheets during an outage; older ones are dropped beyond this
+
+# Class to interact with Google Sheets
+class GoogleSheetsClient:
+    def __init__(self, config: Config, logger: logging.Logger):
+        self.config = config
+        self.logger = logger
+        self.client: Optional[Client] = None
+        self.sheet: Optional[Worksheet] = None
+        self._creds: Optional[ServiceAccountCredentials] = None  # Loaded once and reused across init retries
+        self._token_cache_path = f"{config.credentials_file}.token"  # OAuth token saved for the next start
+        self._queue: queue.Queue = queue.Queue(maxsize=1000)  # Rows handed from the polling loop to the writer thread
+        # Retry policy for batched writes: jittered exponential backoff on API and network errors
+        self._append_retrying = Retrying(
+            stop=stop_after_attempt(config.max_retries),
+            wait=wait_exponential(multiplier=config.retry_backoff_factor, min=1, max=30) + wait_random(0, 1),
+            retry=retry_if_exception_type((gspread.exceptions.APIError, requests.RequestException)),
+            before_sleep=before_sleep_log(logger, logging.WARNING),
+            reraise=True
+        )
+        self._initialize_client()  # Initialize client on creation
+        self._writer = threading.Thread(target=self._writer_loop, name="sheets-writer", daemon=True)
+        self._writer.start()  # Sheets API latency no longer delays the next poll
+
+    # Initialize Google Sheets client with retry logic
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+    def _initialize_client(self) -> None:
+        try:
+            creds = self._load_credentials()
+            self.client = gspread.authorize(creds)  # Authenticate with Google Sheets
+            self.sheet = self.client.open_by_key(self.config.sheet_id).sheet1  # Open first sheet
+            self._save_token(creds)
+        except Exception as e:
+            self.logger.error("Failed to initialize Google Sheets client: %s", e)
+            self.client = None
+            self.sheet = None
+            raise
+
+    # Read the service account keyfile once; retries of _initialize_client reuse the same credentials
+    def _load_credentials(self) -> ServiceAccountCredentials:
+        if self._creds is not None:
+            return self._creds
+        if not os.path.exists(self.config.credentials_file):
+            self.logger.error("Credentials file not found: %s", self.config.credentials_file)
+            raise FileNotFoundError(f"Credentials file not found: {self.config.credentials_file}")
+        with open(self.config.credentials_file, "rb") as f:
+            keyfile = orjson.loads(f.read())
+        creds = ServiceAccountCredentials.from_service_account_info(keyfile, scopes=self.config.scopes)
+        self._restore_token(creds)
+        self._creds = creds
+        return creds
+
+    # Reuse an OAuth token saved by a previous run if it is newer than the keyfile and not expired
+    def _restore_token(self, creds: ServiceAccountCredentials) -> None:
+        try:
+            if os.path.getmtime(self._token_cache_path) < os.path.getmtime(self.config.credentials_file):
+                return  # Keyfile changed since the token was saved
+            with open(self._token_cache_path, "rb") as f:
+                cached = orjson.loads(f.read())
+            if tuple(cached.get("scopes") or ()) != self.config.scopes:
+                return  # Token was minted for different scopes
+            creds.token = cached["access_token"]
+            creds.expiry = datetime.strptime(cached["token_expiry"], "%Y-%m-%dT%H:%M:%S")
+            if not creds.valid:  # Expired or inside google-auth's early-refresh window
+                creds.token = None
+                creds.expiry = None
+            else:
+                self.logger.debug("Reusing cached OAuth token from %s", self._token_cache_path)
+        except FileNotFoundError:
+            pass  # No token saved yet
+        except Exception as e:
+            self.logger.warning("Ignoring unreadable OAuth token cache %s: %s", self._token_cache_path, e)
+
+    # Save the current OAuth token so the next start can skip minting a new one
+    def _save_token(self, creds: ServiceAccountCredentials) -> None:
+        if not creds.token or creds.expiry is None:
+            return
+        try:
+            payload = orjson.dumps({
+                "access_token": creds.token,
+                "token_expiry": creds.expiry.strftime("%Y-%m-%dT%H:%M:%S"),  # Naive UTC, as google-auth stores it
+                "scopes": self.config.scopes
+            })
+            fd = os.open(self._token_cache_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)  # Owner-only, like the keyfile
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+        except Exception as e:
+            self.logger.warning("Failed to save OAuth token cache %s: %s", self._token_cache_path, e)
+
+    # Hand a row to the background writer; never blocks the polling loop
+    def queue_row(self, row: List[Any]) -> None:
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.logger.error("Google Sheets write queue is full; dropping row %s", row)
+
+    # Stop the background writer after it writes any queued rows
+    def close(self, timeout: float = 60.0) -> None:
+        self._queue.put(_WRITER_STOP)
+        self._writer.join(timeout)
+        if self._writer.is_alive():
+            self.logger.error("Google Sheets writer did not finish within %.0fs; queued rows may be lost", timeout)
+
+    # Background writer: collect rows and write them in one request once the batch is full or the flush interval has passed
+    def _writer_loop(self) -> None:
+        pending: List[List[Any]] = []  # Rows waiting for the next batched write
+        last_flush = time.monotonic()  # Time of the last batched write attempt
+        retry_after = 0.0  # After a failed write, no attempt (not even for a full batch) before this monotonic time
+        stopping = False
+        while not stopping:
+            timeout = None
+            if pending:
+                deadline = max(last_flush + self.config.sheets_flush_interval, retry_after)
+                timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+                while True:  # Drain whatever else is already queued
+                    if item is _WRITER_STOP:
+                        stopping = True
+                        break
+                    pending.append(item)
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            if len(pending) > SHEETS_MAX_PENDING_ROWS:
+                dropped = len(pending) - SHEETS_MAX_PENDING_ROWS
+                del pending[:dropped]
+                self.logger.error("Google Sheets backlog is full; dropped the %d oldest row(s)", dropped)
+            if not pending:
+                continue
+            now = time.monotonic()
+            if not stopping and now < retry_after:
+                continue  # Still backing off from a failed write
+            if stopping or len(pending) >= self.config.sheets_batch_size \
+                    or now - last_flush >= self.config.sheets_flush_interval:
+                last_flush = time.monotonic()
+                if self._write(pending):
+                    pending = []
+                else:
+                    retry_after = time.monotonic() + self.config.sheets_flush_interval  # Keep rows and wait a full interval before retrying
+        if pending:
+            self.logger.error("Dropping %d row(s) that could not be written to Google Sheets on shutdown", len(pending))
+
+    # Write rows with the retry policy; returns False if every attempt failed
+    def _write(self, rows: List[List[Any]]) -> bool:
+        if self.sheet is None:
+            self.logger.error("Google Sheets client not initialized")
+            return False
+        try:
+            self._append_retrying(self._do_append, rows)
+        except Exception as e:
+            self.logger.error("Failed to append rows to Google Sheet; rows kept for the next flush: %s", e)
+            return False
+        return True
+
+    # Append all queued rows to the sheet in one request
+    def _do_append(self, rows: List[List[Any]]) -> None:
+        self.sheet.append_rows(rows, value_input_option="RAW", insert_data_option="INSERT_ROWS")  # Insert new rows instead of overwriting cells below the table
+
+# Status of one configured monitor for a single poll (orjson serializes dataclasses natively)
+@dataclass(slots=True)
+class MonitorStatus:
+    id: str  # Shinobi monitor ID ("mid")
+    name: str  # Monitor display name
+    recording: bool  # True if mode is "record"
+    operational: bool  # True if recording and status is "Recording"
+    mode: str  # Raw Shinobi monitor mode
+    status: str  # Raw Shinobi monitor status
+
+# Process monitor data and calculate metrics
+def process_monitors(monitors_data: Optional[List[Dict[str, Any]]], config: Config, logger: logging.Logger) -> Dict[str, Any]:
+    if not monitors_data or not isinstance(monitors_data, list):
+        logger.error("Invalid or no monitor data received")
+        return {"monitors": [], "metrics": {}}  # Return empty data on failure
+
+    logger.debug("Processing monitors: %s", monitors_data)
+    logger.debug("Configured monitor IDs: %s", config.monitor_ids)
+
+    debug = logger.isEnabledFor(logging.DEBUG)  # Checked once, not per monitor
+    pending_ids = set(config._monitor_id_set)  # Configured IDs not yet seen; removing on match also skips duplicates
+    monitor_statuses: List[MonitorStatus] = []
+    recording_count = 0  # Operational monitors, counted in the same pass
+    for monitor in monitors_data:
+        monitor_id = monitor.get("mid")
+        if debug:
+            logger.debug("Checking monitor ID: %s", monitor_id)
+        if monitor_id in pending_ids:
+            pending_ids.remove(monitor_id)
+            mode = monitor.get("mode", "Unknown")
+            state = monitor.get("status", "Unknown")
+            recording = mode == MODE_RECORD
+            operational = recording and state == STATUS_RECORDING
+            status = MonitorStatus(monitor_id, monitor.get("name", "Unknown"), recording, operational, mode, state)
+            monitor_statuses.append(status)
+            recording_count += operational
+            if debug:
+                logger.debug("Monitor status: %s", status)
+                if not operational:
+                    # Log non-operational monitors to file (DEBUG level); JsonFormatter serializes the status under its own key
+                    logger.debug("Monitor not operational", extra={"status": status})
+            if not pending_ids:
+                break  # Every configured monitor has been seen; skip the rest of the list
+
+    # Identify missing monitors
+    missing_monitors = [mid for mid in config.monitor_ids if mid in pending_ids] if pending_ids else []  # Keep configured order
+    if missing_monitors:
+        logger.warning("Missing monitors: %s", missing_monitors)
+
+    # Calculate metrics
+    total_cameras = len(config.monitor_ids)
+    percentage_recording = 0.0
+    if total_cameras > 0:
+        percentage_recording = round((recording_count / total_cameras) * 100, 2)
+    
+    stamp = datetime.now(config._tz).isoformat(timespec="seconds")  # One clock read and one format call: "YYYY-MM-DDTHH:MM:SS+HH:MM"
+    metrics = {
+        "date": stamp[:10],
+        "time": stamp[11:19],
+        "total_cameras": total_cameras,
+        "recording": recording_count,
+        "not_recording": total_cameras - recording_count,
+        "percentage_recording": percentage_recording,
+        "threshold_met": "Yes" if percentage_recording >= 75.0 else "No"
+    }
+
+    logger.debug("Processed metrics: %s", metrics)
+    return {"monitors": monitor_statuses, "metrics": metrics, "missing_monitors": missing_monitors}
+
+# Append each cycle's metrics as one JSON line to a daily NDJSON file, keeping the file open between cycles
+class MetricsWriter:
+    def __init__(self, config: Config, logger: logging.Logger):
+        self.config = config
+        self.logger = logger
+        self._file = None  # Open handle for the current day's file
+        self._date: Optional[str] = None  # Local date of the open file
+        self._path = ""  # Path of the open file
+
+    # Write one record, switching to a new file when the local date changes
+    def write(self, data: Dict[str, Any]) -> str:
+        try:
+            date = data["metrics"]["date"]
+            if date != self._date:
+                self._open(date)
+            self._file.write(orjson.dumps(data) + b"\n")
+            self._file.flush()  # Hand the line to the OS so a crash doesn't lose buffered cycles
+            return self._path
+        except Exception as e:
+            self.logger.error("Failed to save metrics to %s: %s", self._path or self.config.output_dir, e)
+            return ""
+
+    # Open (or reopen) the metrics file for the given local date in append mode
+    def _open(self, date: str) -> None:
+        self.close()
+        os.makedirs(self.config.output_dir, exist_ok=True)  # Create output directory if it doesn't exist
+        self._path = os.path.normpath(os.path.join(self.config.output_dir, f"monitor_data_{date}.ndjson"))
+        self._file = open(self._path, "ab")
+        self._date = date
+
+    # Close the open metrics file, if any
+    def close(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception as e:
+                self.logger.warning("Failed to close metrics file %s: %s", self._path, e)
+            self._file = None
+            self._date = None
+
+# Delete metric files older than log_retention_days
+def cleanup_old_metrics(config: Config, logger: logging.Logger) -> None:
+    cutoff_time = time.time() - (config.log_retention_days * 86400)
+    try:
+        # scandir returns the stat info alongside each entry, avoiding a separate getmtime call per file
+        with os.scandir(config.output_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith("monitor_data_") and entry.name.endswith((".ndjson", ".json")):  # .json: per-cycle files from older versions
+                    if entry.stat().st_mtime < cutoff_time:
+                        try:
+                            os.remove(entry.path)
+                            logger.debug("Deleted old log file: %s", entry.path)
+                        except Exception as e:
+                            logger.warning("Failed to delete old log file %s: %s", entry.path, e)
+    except FileNotFoundError:
+        pass  # Output directory not created yet; nothing to clean up
+
+# Run cleanup_old_metrics in a background thread every CLEANUP_INTERVAL seconds until stop_event is set
+def start_metrics_cleanup(config: Config, logger: logging.Logger, stop_event: threading.Event) -> threading.Thread:
+    def run() -> None:
+        while True:
+            try:
+                cleanup_old_metrics(config, logger)
+            except Exception as e:
+                logger.error("Metric file cleanup failed: %s", e)
+            if stop_event.wait(CLEANUP_INTERVAL):  # Wakes early on shutdown
+                break
+
+    thread = threading.Thread(target=run, name="metrics-cleanup", daemon=True)
+    thread.start()
+    return thread
+
+# Print metrics and monitor statuses to console
+def print_metrics(data: Dict[str, Any]) -> None:
+    if not STDOUT_IS_TTY:
+        return  # Under systemd/Docker the same data is already in the JSON log
+    metrics = data["metrics"]
+    lines = [
+        "\nMonitor Metrics:",
+        f"  Date: {metrics['date']}",
+        f"  Time: {metrics['time']}",
+        f"  Total Cameras: {metrics['total_cameras']}",
+        f"  Recording: {metrics['recording']}",
+        f"  Not Recording: {metrics['not_recording']}",
+        f"  Percentage Recording: {metrics['percentage_recording']}%",
+        f"  Threshold Met: {metrics['threshold_met']}",
+        "\nMonitor Statuses:"
+    ]
+    for status in data["monitors"]:
+        lines.append(f"  ID: {status.id}  Name: {status.name}  Recording: {status.recording}  Operational: {status.operational} (Mode: {status.mode}, Status: {status.status})")
+    if data["missing_monitors"]:
+        lines.append(f"\nWarning: Missing monitors: {data['missing_monitors']}")
+    lines.append("")
+    sys.stdout.write("\n".join(lines))  # One write for the whole report
+    sys.stdout.flush()
+
+# Main loop to monitor Shinobi server and update Google Sheet
+def main() -> None:
+    print("Starting Shinobi Monitor Script...")
+    try:
+        config = load_config()  # Load and validate configuration
+    except Exception as e:
+        logging.getLogger(__name__).error("Failed to load configuration: %s", e)
+        print(f"Error: Failed to load configuration: {e}")
+        return
+
+    logger = setup_logging(config.timezone)
+    logger.info("Shinobi Monitor Script started")
+    safe_config = config.model_dump(exclude={'api_key', 'credentials_file'})  # Dump once, excluding sensitive fields
+    logger.info("Configuration loaded: %s", safe_config)
+
+    api = ShinobiAPI(config, logger)  # Initialize Shinobi API client
+    notifier = AppsScriptNotifier(config, logger)  # Initialize Apps Script notifier
+    sheets_client = GoogleSheetsClient(config, logger)  # Initialize Google Sheets client
+    metrics_writer = MetricsWriter(config, logger)  # Initialize local metrics file writer
+    shutdown = threading.Event()  # Set by signal handlers; also stops the background cleanup thread
+    consecutive_failures = 0
+    last_notification_time = 0.0  # Track time of last server-down notification
+    server_was_up = True  # Track if server was previously up
+    last_written_state: Optional[tuple] = None  # Monitor states of the last cycle written to file and Sheets
+    last_write_time = float("-inf")  # Monotonic time of that write
+
+    # Handle shutdown signals (Ctrl+C, SIGTERM)
+    def signal_handler(sig: int, frame: Optional[object]) -> None:
+        logger.info("Shutdown signal received")
+        shutdown.set()  # Wakes the main loop if it is waiting for the next poll
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    next_tick = time.monotonic()  # Monotonic deadline of the current poll
+
+    # Wait until the next poll deadline so the interval does not drift; returns early on shutdown
+    def sleep_until_next_tick() -> None:
+        nonlocal next_tick
+        next_tick += config.update_interval
+        now = time.monotonic()
+        if next_tick < now:
+            next_tick = now  # Fell behind; skip missed polls instead of bursting
+        shutdown.wait(next_tick - now)
+
+    # Notify that the server is down on the first failure or once the cooldown has passed; the message is only built when sent
+    def report_server_down(server_status: str) -> None:
+        nonlocal last_notification_time, server_was_up
+        current_time = time.time()
+        if server_was_up or (current_time - last_notification_time) >= config.notification_cooldown:
+            message = f"Shinobi server at {config.shinobi_host}:{config.shinobi_port} is down (Status: {server_status}). Please check the server."
+            if notifier.trigger(message):
+                last_notification_time = current_time
+            server_was_up = False
+
+    start_metrics_cleanup(config, logger, shutdown)  # Retention is in days, so an hourly background pass is enough
+
+    try:
+        while not shutdown.is_set():
+            try:
+                server_status, monitors_data = api.poll()  # Check server status and fetch monitors in one request
+                print(f"Shinobi Server Status: {server_status}")
+                logger.info("Shinobi Server Status: %s", server_status)
+
+                if server_status != "OK":
+                    consecutive_failures += 1
+                    report_server_down(server_status)
+                    logger.warning("Shinobi server check failed (attempt %d/%d)", consecutive_failures, config.max_consecutive_failures)
+                    if consecutive_failures >= config.max_consecutive_failures:
+                        error_msg = f"Shinobi server unreachable after {config.max_consecutive_failures} attempts. Exiting script."
+                        logger.error(error_msg)
+                        print(f"Error: {error_msg}")
+                        notifier.trigger(error_msg)  # Notify on script exit
+                        sys.exit(1)
+                    sleep_until_next_tick()
+                    continue
+
+                consecutive_failures = 0
+                server_was_up = True  # Reset server status
+
+                processed_data = process_monitors(monitors_data, config, logger)  # Process monitor data
+            
+                if processed_data["metrics"]:
+                    # Everything except the date/time stamp; skip writes while it repeats, apart from a periodic heartbeat
+                    state = (processed_data["monitors"], processed_data["missing_monitors"])  # Counts and percentages derive from these
+                    now = time.monotonic()
+                    if state != last_written_state or now - last_write_time >= config.unchanged_write_interval:
+                        metrics_writer.write(processed_data)  # Append metrics to the daily NDJSON file
+                        sheets_client.queue_row([
+                            processed_data["metrics"]["date"],
+                            processed_data["metrics"]["time"],
+                            processed_data["metrics"]["total_cameras"],
+                            processed_data["metrics"]["recording"],
+                            processed_data["metrics"]["percentage_recording"],
+                            processed_data["metrics"]["threshold_met"]
+                        ])  # Queue row for the background batched write
+                        last_written_state = state
+                        last_write_time = now
+                    else:
+                        logger.debug("Monitor states unchanged; skipping file and Sheets write")
+                    print_metrics(processed_data)  # Print metrics to console
+            
+                sleep_until_next_tick()
+            except Exception as e:
+                logger.error("Unexpected error in main loop: %s", e)
+                sleep_until_next_tick()
+    finally:
+        shutdown.set()  # Stop the background cleanup thread (also on sys.exit)
+        sheets_client.close()  # Write any queued rows before exiting
+        metrics_writer.close()
+
+if __name__ == "__main__":
+    main()  # Run the main monitoring loop
\ No newline at end of file
@@ -1,35 +1,35 @@
 import os
 import sys
 import json
+import queue
+import atexit
 import time
 import signal
 import logging
-import requests
+import threading
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Sequence, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
 
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-
-import gspread
-from gspread import Client, Worksheet  # Correct and concise
-from gspread.spreadsheet import Spreadsheet  # Only if directly needed
-
-from oauth2client.service_account import ServiceAccountCredentials
-from pydantic import BaseModel, ValidationError
-from dotenv import load_dotenv
-import pytz  # If you're using timezones
-
-# Check dependencies
+# Import third-party dependencies, exiting with an install hint if any are missing
 try:
+    import orjson
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
     import gspread
-    import oauth2client
-    import pydantic
-    import dotenv
-    import pytz
+    from gspread import Client, Worksheet  # Correct and concise
+    from gspread.spreadsheet import Spreadsheet  # Only if directly needed
+
+    from oauth2client.service_account import ServiceAccountCredentials
+    from pydantic import BaseModel, PrivateAttr, ValidationError
+    from dotenv import load_dotenv
+    import pytz  # If you're using timezones
 except ImportError as e:
-    print(f"Error: Missing required package: {e.name}. Install with 'pip install requests python-dotenv gspread oauth2client pydantic pytz'")
+    print(f"Error: Missing required package: {e.name}. Install with 'pip install orjson requests python-dotenv gspread oauth2client pydantic pytz'")
     sys.exit(1)
 
 # Configuration model
@@ -47,6 +47,15 @@ class Config(BaseModel):
     max_retries: int
     retry_backoff_factor: float
     timezone: str
+    _monitor_id_set: frozenset = PrivateAttr(default=frozenset())  # monitor_ids as a set, built once
+    _tz: Any = PrivateAttr(default=None)  # pytz timezone object, resolved once
+
+    def model_post_init(self, __context: Any) -> None:
+        self._monitor_id_set = frozenset(self.monitor_ids)
+        self._tz = pytz.timezone(self.timezone)
+
+# Attributes every LogRecord has; anything else was passed through extra= and goes into the JSON output
+_LOG_RECORD_ATTRS = frozenset(logging.LogRecord("", 0, "", 0, "", None, None).__dict__) | {"message", "asctime"}
 
 # Structured log formatter
 class JsonFormatter(logging.Formatter):
@@ -56,36 +65,72 @@ class JsonFormatter(logging.Formatter):
 
     def format(self, record):
         log_record = {
-            "timestamp": datetime.now(self.tz).isoformat(),
+            "timestamp": datetime.fromtimestamp(record.created, self.tz).isoformat(timespec="milliseconds"),  # Time the record was made; no extra clock read
             "level": record.levelname,
             "message": record.getMessage(),
             "module": record.module,
             "line": record.lineno
         }
-        return json.dumps(log_record)
+        extra = record.__dict__.keys() - _LOG_RECORD_ATTRS  # One set difference instead of a Python-level check per attribute
+        for key in extra:
+            log_record[key] = record.__dict__[key]
+        return orjson.dumps(log_record).decode()
+
+# Background listener that writes queued log records to the console and file handlers
+_log_listener: Optional[QueueListener] = None
+
+# Stop the background log listener, flushing any queued records
+def _stop_log_listener() -> None:
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()  # Release the log file
+        _log_listener = None
+
+atexit.register(_stop_log_listener)  # Drain pending log records on interpreter exit
 
 # Initialize logger
 def setup_logging(timezone: str) -> logging.Logger:
+    global _log_listener
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.INFO)
+    for handler in logger.handlers:
+        handler.close()
     logger.handlers.clear()  # Clear existing handlers to prevent duplicates
+    _stop_log_listener()  # Stop the listener from a previous setup before replacing it
+    handlers: List[logging.Handler] = []
     
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(JsonFormatter(timezone))
-    logger.addHandler(console_handler)
+    handlers.append(console_handler)
     
     try:
         file_handler = logging.FileHandler("shinobi_monitor.log")
         file_handler.setFormatter(JsonFormatter(timezone))
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
     except Exception as e:
         print(f"Warning: Failed to set up file logging: {e}")
     
+    # Log calls only enqueue records; formatting and disk writes happen on the listener thread
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(log_queue))
+    _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+    
     logger.propagate = False
     return logger
 
+# Apply the configured timezone to the running JSON handlers without rebuilding them
+def set_log_timezone(timezone: str) -> None:
+    tz = pytz.timezone(timezone)
+    if _log_listener is not None:
+        for handler in _log_listener.handlers:
+            if isinstance(handler.formatter, JsonFormatter):
+                handler.formatter.tz = tz
+
 def load_config(env_path: str = ".env") -> Config:
-    logger = setup_logging("Asia/Kolkata")
+    logger = logging.getLogger(__name__)
     logger.info("Loading configuration from .env")
     if not os.path.exists(env_path):
         logger.error(f".env file not found at {env_path}")
@@ -163,35 +208,39 @@ class ShinobiAPI:
         retries = Retry(
             total=self.config.max_retries,
             backoff_factor=self.config.retry_backoff_factor,
-            status_forcelist=[429, 500, 502, 503, 504]
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+            raise_on_status=False  # Hand back the last response once retries run out; raise_for_status reports it
         )
-        adapter = HTTPAdapter(max_retries=retries)
+        adapter = HTTPAdapter(max_retries=retries, pool_connections=1, pool_maxsize=1)  # One host polled from one thread; keep one reusable connection
         session.mount("http://", adapter)
         session.mount("https://", adapter)
+        session.headers.update({"Accept": "application/json", "User-Agent": "shinobi-monitor/1.0"})
         return session
 
     def get_all_monitors(self) -> Optional[List[Dict[str, Any]]]:
+        # Timeouts, connection errors and retryable statuses are retried by the session's adapter
         endpoint = f"monitor/{self.config.group_key}"
-        for attempt in range(self.config.max_retries):
-            try:
-                resp = self.session.get(f"{self.base_url}/{endpoint}", timeout=10)
-                resp.raise_for_status()
-                data = resp.json()
-                if isinstance(data, dict) and not data.get("ok"):
-                    self.logger.error(f"API error: {data.get('msg', 'Unknown error')}")
-                    return None
-                return data
-            except requests.Timeout as e:
-                self.logger.warning(f"Timeout on attempt {attempt + 1}: {str(e)}")
-                if attempt < self.config.max_retries - 1:
-                    time.sleep(self.config.retry_backoff_factor * (2 ** attempt))
-                continue
-            except requests.RequestException as e:
-                self.logger.error(f"Request error: {str(e)}")
-                return None
-        self.logger.error("Max retries reached for API request")
-        return None
-
+        try:
+            resp = self.session.get(f"{self.base_url}/{endpoint}", timeout=10)
+            resp.raise_for_status()
+            data = orjson.loads(resp.content)
+        except requests.RequestException as e:
+            self.logger.error(f"Request error: {str(e)}")
+            return None
+        except orjson.JSONDecodeError as e:
+            self.logger.error(f"Invalid JSON from Shinobi API: {str(e)}")
+            return None
+        if isinstance(data, dict) and not data.get("ok"):
+            self.logger.error(f"API error: {data.get('msg', 'Unknown error')}")
+            return None
+        return data
+
+
+# Rows are written to Google Sheets in batches: when this many are queued or the oldest has waited FLUSH_INTERVAL seconds
+SHEETS_BATCH_SIZE = 10
+SHEETS_FLUSH_INTERVAL = 600.0
 
 class GoogleSheetsClient:
     def __init__(self, config: Config, logger: logging.Logger):
@@ -199,6 +248,11 @@ class GoogleSheetsClient:
         self.logger = logger
         self.client: Optional[Client] = None
         self.sheet: Optional[Worksheet] = None  # Changed from Spreadsheet to Worksheet
+        self._pending: List[Sequence[Any]] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sheets-writer")
+        self._inflight: Optional[Future] = None
         self._initialize_client()
 
     def _initialize_client(self) -> None:
@@ -218,30 +272,64 @@ class GoogleSheetsClient:
             self.client = None
             self.sheet = None
 
-    def append_row(self, row: List[Any]) -> bool:
+    def append_row(self, row: Sequence[Any]) -> bool:
+        self._pending.append(row)
+        return self.flush()
+
+    def flush(self, force: bool = False) -> bool:
+        if force and self._inflight is not None:
+            self._inflight.result()  # Shutdown: let the batch in flight finish (or re-queue its rows) first
+        with self._lock:
+            if not self._pending:
+                return True
+            if not force and len(self._pending) < SHEETS_BATCH_SIZE \
+                    and time.monotonic() - self._last_flush < SHEETS_FLUSH_INTERVAL:
+                return True
+            if not force and self._inflight is not None and not self._inflight.done():
+                return True  # Previous batch is still being written; these rows go out with the next one
+            rows, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+        if force:
+            return self._write_rows(rows)
+        # Write in the background so Sheets latency and retries overlap the wait for the next poll
+        self._inflight = self._executor.submit(self._write_rows, rows)
+        return True
+
+    def _requeue(self, rows: List[Sequence[Any]]) -> None:
+        with self._lock:
+            self._pending[:0] = rows
+
+    def _write_rows(self, rows: List[Sequence[Any]]) -> bool:
         if self.sheet is None:
-            self.logger.error("Google Sheets client not initialized")
-            return False
+            # A failed authorization leaves no sheet; try again rather than requeueing every later flush forever
+            self._initialize_client()
+            if self.sheet is None:
+                self.logger.error("Google Sheets client not initialized")
+                self._requeue(rows)
+                return False
         for attempt in range(self.config.max_retries):
             try:
-                self.sheet.append_row(row) # type: ignore[union-attr]
+                self.sheet.append_rows(rows, value_input_option="RAW", insert_data_option="INSERT_ROWS") # type: ignore[union-attr]
                 return True
             except Exception as e:
-                self.logger.warning(f"Failed to append row on attempt {attempt + 1}: {str(e)}")
+                self.logger.warning(f"Failed to append rows on attempt {attempt + 1}: {str(e)}")
                 time.sleep(self.config.retry_backoff_factor * (2 ** attempt))
-        self.logger.error("Max retries reached for appending to Google Sheet")
+        self.logger.error("Max retries reached for appending to Google Sheet; rows kept for the next flush")
+        self._requeue(rows)
         return False
         
-def process_monitors(monitors_data: Optional[List[Dict[str, Any]]], config: Config, logger: logging.Logger) -> Dict[str, Any]:
+# Returns the data to save, plus the Google Sheets row and the timestamp it was taken at (None when there is no data)
+def process_monitors(monitors_data: Optional[List[Dict[str, Any]]], config: Config, logger: logging.Logger) -> Tuple[Dict[str, Any], Optional[Tuple[Any, ...]], Optional[datetime]]:
     if not monitors_data or not isinstance(monitors_data, list):
         logger.error("Invalid or no monitor data received")
-        return {"monitors": [], "metrics": {}}
+        return {"monitors": [], "metrics": {}}, None, None
 
     seen_ids = set()
     monitor_statuses = []
+    warn = logger.isEnabledFor(logging.WARNING)
     for monitor in monitors_data:
         monitor_id = monitor.get("mid")
-        if monitor_id in config.monitor_ids and monitor_id not in seen_ids:
+        if monitor_id in config._monitor_id_set and monitor_id not in seen_ids:
             seen_ids.add(monitor_id)
             operational = monitor.get("mode") == "record" and monitor.get("status") == "Recording"
             status = {
@@ -253,18 +341,10 @@ def process_monitors(monitors_data: Optional[List[Dict[str, Any]]], config: Conf
                 "status": monitor.get("status", "Unknown")
             }
             monitor_statuses.append(status)
-            if not operational:
-                logger.warning(json.dumps({
-                    "monitor_id": status["id"],
-                    "name": status["name"],
-                    "recording": status["recording"],
-                    "operational": status["operational"],
-                    "mode": status["mode"],
-                    "status": status["status"],
-                    "message": "Monitor not operational"
-                }))
-
-    missing_monitors = [mid for mid in config.monitor_ids if mid not in seen_ids]
+            if not operational and warn:
+                logger.warning("Monitor not operational", extra={"status": status})  # JsonFormatter serializes the status dict as-is
+
+    missing_monitors = [mid for mid in config.monitor_ids if mid not in seen_ids] if len(seen_ids) < len(config._monitor_id_set) else []
     if missing_monitors:
         logger.warning(f"Missing monitors: {missing_monitors}")
 
@@ -274,10 +354,10 @@ def process_monitors(monitors_data: Optional[List[Dict[str, Any]]], config: Conf
     if total_cameras > 0:
         percentage_recording = round((recording_count / total_cameras) * 100, 2)
     
-    tz = pytz.timezone(config.timezone)
+    now = datetime.now(config._tz)  # One timestamp, so date and time can't straddle midnight
     metrics = {
-        "date": datetime.now(tz).strftime("%Y-%m-%d"),
-        "time": datetime.now(tz).strftime("%H:%M:%S"),
+        "date": now.strftime("%Y-%m-%d"),
+        "time": now.strftime("%H:%M:%S"),
         "total_cameras": total_cameras,
         "recording": recording_count,
         "not_recording": total_cameras - recording_count,
@@ -285,19 +365,36 @@ def process_monitors(monitors_data: Optional[List[Dict[str, Any]]], config: Conf
         "threshold_met": "Yes" if percentage_recording >= 75.0 else "No"
     }
 
-    return {"monitors": monitor_statuses, "metrics": metrics, "missing_monitors": missing_monitors}
+    # Google Sheets row, in column order, built from the values already at hand
+    sheets_row = (metrics["date"], metrics["time"], total_cameras, recording_count, percentage_recording, metrics["threshold_met"])
 
-def save_metrics(metrics: Dict[str, Any], config: Config, logger: logging.Logger) -> str:
-    try:
-        os.makedirs(config.output_dir, exist_ok=True)
-        timestamp = datetime.now(pytz.timezone(config.timezone)).strftime("%Y%m%d_%H%M%S")
-        output_path = os.path.normpath(os.path.join(config.output_dir, f"monitor_statuses_{timestamp}.json"))
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(metrics, f, indent=2)
-        return output_path
-    except Exception as e:
-        logger.error(f"Failed to save metrics to {output_path}: {str(e)}")
-        return ""
+    return {"monitors": monitor_statuses, "metrics": metrics, "missing_monitors": missing_monitors}, sheets_row, now
+
+# Writes each tick's metrics to a timestamped JSON file; the output directory is created once up front
+class MetricsPersistor:
+    def __init__(self, config: Config, logger: logging.Logger):
+        self.logger = logger
+        self.out_dir = Path(config.output_dir)
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+        except OSError as e:
+            self.logger.error(f"Failed to create output directory {self.out_dir}: {str(e)}")
+
+    def save(self, metrics: Dict[str, Any], now: datetime) -> str:
+        timestamp = now.strftime("%Y%m%d_%H%M%S")  # Same instant as the metrics' date and time fields
+        output_path = self.out_dir / f"monitor_statuses_{timestamp}.json"
+        try:
+            payload = orjson.dumps(metrics, option=orjson.OPT_INDENT_2)
+            try:
+                output_path.write_bytes(payload)
+            except FileNotFoundError:
+                # Output directory was removed while running; recreate it and retry once
+                os.makedirs(self.out_dir, exist_ok=True)
+                output_path.write_bytes(payload)
+            return str(output_path)
+        except Exception as e:
+            self.logger.error(f"Failed to save metrics to {output_path}: {str(e)}")
+            return ""
 
 def print_metrics(data: Dict[str, Any]) -> None:
     metrics = data["metrics"]
@@ -317,52 +414,54 @@ def print_metrics(data: Dict[str, Any]) -> None:
 
 def main() -> None:
     print("Starting Shinobi Monitor Script...")
+    # Handlers are built once, in UTC until the configured timezone is known, so config errors reach the log file too
+    logger = setup_logging("UTC")
     try:
         config = load_config()
     except Exception as e:
-        logging.getLogger(__name__).error(f"Failed to load configuration: {str(e)}")
+        logger.error(f"Failed to load configuration: {str(e)}")
         print(f"Error: Failed to load configuration: {e}")
+        _stop_log_listener()
         return
 
-    logger = setup_logging(config.timezone)
+    set_log_timezone(config.timezone)
     logger.info("Shinobi Monitor Script started")
     
     api = ShinobiAPI(config, logger)
     sheets_client = GoogleSheetsClient(config, logger)
-    shutdown = False
+    persistor = MetricsPersistor(config, logger)
+    stop_event = threading.Event()  # Set by the signal handler; also wakes the loop out of its sleep
 
     def signal_handler(sig: int, frame: Optional[object]) -> None:
-        nonlocal shutdown
         logger.info("Shutdown signal received")
-        shutdown = True
+        stop_event.set()
 
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
 
-    while not shutdown:
-        try:
-            start_time = time.time()
-            monitors_data = api.get_all_monitors()
-            processed_data = process_monitors(monitors_data, config, logger)
-            
-            if processed_data["metrics"]:
-                save_metrics(processed_data, config, logger)
-                sheets_client.append_row([
-                    processed_data["metrics"]["date"],
-                    processed_data["metrics"]["time"],
-                    processed_data["metrics"]["total_cameras"],
-                    processed_data["metrics"]["recording"],
-                    processed_data["metrics"]["percentage_recording"],
-                    processed_data["metrics"]["threshold_met"]
-                ])
-                print_metrics(processed_data)
-            
-            elapsed_time = time.time() - start_time
-            sleep_time = max(config.update_interval - elapsed_time, 0)
-            time.sleep(sleep_time)
-        except Exception as e:
-            logger.error(f"Unexpected error in main loop: {str(e)}")
-            time.sleep(config.update_interval)
+    next_deadline = time.monotonic() + config.update_interval
+    try:
+        while not stop_event.is_set():
+            try:
+                monitors_data = api.get_all_monitors()
+                processed_data, sheets_row, now = process_monitors(monitors_data, config, logger)
+                
+                if processed_data["metrics"]:
+                    persistor.save(processed_data, now)
+                    sheets_client.append_row(sheets_row)
+                    print_metrics(processed_data)
+            except Exception as e:
+                logger.error(f"Unexpected error in main loop: {str(e)}")
+
+            # Ticks run on a fixed monotonic cadence, so slow ticks don't drift the schedule and clock jumps don't matter;
+            # after an overrun the schedule restarts from now instead of firing back-to-back catch-up ticks
+            tick_end = time.monotonic()
+            if stop_event.wait(max(next_deadline - tick_end, 0)):
+                break
+            next_deadline = max(next_deadline, tick_end) + config.update_interval
+    finally:
+        sheets_client.flush(force=True)  # Write any buffered rows before exiting
+        _stop_log_listener()  # Write out queued log records before exiting
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
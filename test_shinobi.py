@@ -4,30 +4,29 @@ import json
 import time
 import signal
 import logging
-import requests
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, List, Dict, Any
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-import gspread
-from gspread import Client, Worksheet
-from oauth2client.service_account import ServiceAccountCredentials
-from pydantic import BaseModel, ValidationError
-from dotenv import load_dotenv
-import pytz
-from logging.handlers import RotatingFileHandler
-from tenacity import retry, stop_after_attempt, wait_exponential
-
-# Check dependencies
+from typing import Optional, List, Dict, Any, Deque, Tuple
+from logging.handlers import MemoryHandler, RotatingFileHandler
+
+# Import third-party dependencies, exiting with an install hint if any are missing
 try:
+    import orjson
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
     import gspread
-    import oauth2client
-    import pydantic
-    import dotenv
+    from gspread import Client, Worksheet
+    from google.oauth2.service_account import Credentials as ServiceAccountCredentials
+    from google.auth.transport.requests import Request as GoogleAuthRequest
+    from pydantic import BaseModel, PrivateAttr, ValidationError
+    from dotenv import load_dotenv
     import pytz
+    from tenacity import retry, stop_after_attempt, wait_exponential
 except ImportError as e:
-    print(f"Error: Missing required package: {e.name}. Install with 'pip install requests python-dotenv gspread oauth2client pydantic pytz tenacity'")
+    print(f"Error: Missing required package: {e.name}. Install with 'pip install orjson requests python-dotenv gspread google-auth pydantic pytz tenacity'")
     sys.exit(1)
 
 # Configuration model
@@ -51,6 +50,11 @@ class Config(BaseModel):
     notification_cooldown: int
     whatsapp_api_url: str  # Added for WhatsApp notifications
     whatsapp_number: str  # Added for WhatsApp notifications
+    pretty_metrics: bool = False  # Indent saved metrics JSON for reading by hand
+    _monitor_id_set: frozenset = PrivateAttr(default=frozenset())  # monitor_ids as a set, built once
+
+    def model_post_init(self, __context: Any) -> None:
+        self._monitor_id_set = frozenset(self.monitor_ids)
 
 # Structured log formatter
 class JsonFormatter(logging.Formatter):
@@ -60,18 +64,23 @@ class JsonFormatter(logging.Formatter):
 
     def format(self, record):
         log_record = {
-            "timestamp": datetime.now(self.tz).isoformat(),
+            "timestamp": datetime.fromtimestamp(record.created, self.tz).isoformat(),
             "level": record.levelname,
             "message": record.getMessage(),
             "module": record.module,
             "line": record.lineno
         }
-        return json.dumps(log_record)
+        return orjson.dumps(log_record).decode()
+
+# Log records held in memory before they are written to the log file
+LOG_BUFFER_CAPACITY = 100
 
 # Initialize logger
 def setup_logging(timezone: str) -> logging.Logger:
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.DEBUG)
+    for handler in logger.handlers:
+        handler.close()  # Flushes any records still buffered from an earlier setup
     logger.handlers.clear()
     
     # Console handler: Only INFO and above
@@ -89,91 +98,75 @@ def setup_logging(timezone: str) -> logging.Logger:
         )
         file_handler.setLevel(logging.DEBUG)
         file_handler.setFormatter(JsonFormatter(timezone))
-        logger.addHandler(file_handler)
+        # Buffer file writes; flushed every LOG_BUFFER_CAPACITY records, on ERROR, and at exit
+        logger.addHandler(MemoryHandler(LOG_BUFFER_CAPACITY, flushLevel=logging.ERROR, target=file_handler))
     except Exception as e:
         print(f"Warning: Failed to set up file logging: {e}")
     
     logger.propagate = False
     return logger
 
+# (Config field, environment variable, parser, default); a default of None marks the variable as required
+ENV_FIELDS = [
+    ("shinobi_host", "SHINOBI_HOST", str, ""),
+    ("shinobi_port", "SHINOBI_PORT", int, None),
+    ("api_key", "SHINOBI_API_KEY", str, ""),
+    ("group_key", "SHINOBI_GROUP_KEY", str, ""),
+    ("monitor_ids", "MONITOR_IDS", json.loads, None),
+    ("sheet_id", "SHEET_ID", str, ""),
+    ("credentials_file", "CREDENTIALS_FILE", str, ""),
+    ("scopes", "SCOPES", json.loads, None),
+    ("output_dir", "OUTPUT_DIR", str, ""),
+    ("update_interval", "UPDATE_INTERVAL", float, None),
+    ("max_retries", "MAX_RETRIES", int, None),
+    ("retry_backoff_factor", "RETRY_BACKOFF_FACTOR", float, None),
+    ("timezone", "TIMEZONE", str, "Asia/Kolkata"),
+    ("max_consecutive_failures", "MAX_CONSECUTIVE_FAILURES", int, 5),
+    ("log_retention_days", "LOG_RETENTION_DAYS", int, 7),
+    ("apps_script_url", "APPS_SCRIPT_URL", str, ""),
+    ("notification_cooldown", "NOTIFICATION_COOLDOWN", int, 3600),
+    ("whatsapp_api_url", "WHATSAPP_API_URL", str, ""),
+    ("whatsapp_number", "WHATSAPP_NUMBER", str, ""),
+    ("pretty_metrics", "PRETTY_METRICS", lambda value: value.strip().lower() in ("1", "true", "yes"), False),
+]
+# String settings that may be left empty
+OPTIONAL_ENV_FIELDS = {"apps_script_url", "whatsapp_api_url"}
+
 def load_config(env_path: str = ".env") -> Config:
     logger = setup_logging("Asia/Kolkata")
     logger.info("Loading configuration from .env")
     if not os.path.exists(env_path):
-        logger.error(f".env file not found at {env_path}")
+        logger.error(".env file not found at %s", env_path)
         raise FileNotFoundError(f".env file not found at {env_path}")
 
     load_dotenv(env_path)
     
     try:
-        shinobi_port = os.getenv("SHINOBI_PORT")
-        if shinobi_port is None:
-            raise ValueError("Missing required environment variable: SHINOBI_PORT")
-        
-        monitor_ids = os.getenv("MONITOR_IDS")
-        if monitor_ids is None:
-            raise ValueError("Missing required environment variable: MONITOR_IDS")
-        
-        scopes = os.getenv("SCOPES")
-        if scopes is None:
-            raise ValueError("Missing required environment variable: SCOPES")
-        
-        update_interval = os.getenv("UPDATE_INTERVAL")
-        if update_interval is None:
-            raise ValueError("Missing required environment variable: UPDATE_INTERVAL")
-        
-        max_retries = os.getenv("MAX_RETRIES")
-        if max_retries is None:
-            raise ValueError("Missing required environment variable: MAX_RETRIES")
-        
-        retry_backoff_factor = os.getenv("RETRY_BACKOFF_FACTOR")
-        if retry_backoff_factor is None:
-            raise ValueError("Missing required environment variable: RETRY_BACKOFF_FACTOR")
-        
-        max_consecutive_failures = os.getenv("MAX_CONSECUTIVE_FAILURES", "5")
-        log_retention_days = os.getenv("LOG_RETENTION_DAYS", "7")
-        apps_script_url = os.getenv("APPS_SCRIPT_URL", "")
-        notification_cooldown = os.getenv("NOTIFICATION_COOLDOWN", "3600")
-        whatsapp_api_url = os.getenv("WHATSAPP_API_URL", "")  # Added, allow empty
-        whatsapp_number = os.getenv("WHATSAPP_NUMBER") or ""  # Added
-
-        env_config = {
-            "shinobi_host": os.getenv("SHINOBI_HOST") or "",
-            "shinobi_port": int(shinobi_port),
-            "api_key": os.getenv("SHINOBI_API_KEY") or "",
-            "group_key": os.getenv("SHINOBI_GROUP_KEY") or "",
-            "monitor_ids": json.loads(monitor_ids),
-            "sheet_id": os.getenv("SHEET_ID") or "",
-            "credentials_file": os.getenv("CREDENTIALS_FILE") or "",
-            "scopes": json.loads(scopes),
-            "output_dir": os.getenv("OUTPUT_DIR") or "",
-            "update_interval": float(update_interval),
-            "max_retries": int(max_retries),
-            "retry_backoff_factor": float(retry_backoff_factor),
-            "timezone": os.getenv("TIMEZONE", "Asia/Kolkata"),
-            "max_consecutive_failures": int(max_consecutive_failures),
-            "log_retention_days": int(log_retention_days),
-            "apps_script_url": apps_script_url,
-            "notification_cooldown": int(notification_cooldown),
-            "whatsapp_api_url": whatsapp_api_url,  # Added
-            "whatsapp_number": whatsapp_number  # Added
-        }
+        env_config = {}
+        for key, env_name, parse, default in ENV_FIELDS:
+            value = os.environ.get(env_name)
+            if value is None:
+                if default is None:
+                    raise ValueError(f"Missing required environment variable: {env_name}")
+                env_config[key] = default
+            else:
+                env_config[key] = parse(value)
         
         for key, value in env_config.items():
-            if isinstance(value, str) and not value and key not in ["apps_script_url", "whatsapp_api_url"]:
-                logger.error(f"Missing required environment variable: {key.upper()}")
+            if isinstance(value, str) and not value and key not in OPTIONAL_ENV_FIELDS:
+                logger.error("Missing required environment variable: %s", key.upper())
                 raise ValueError(f"Missing required environment variable: {key.upper()}")
 
         try:
             pytz.timezone(env_config["timezone"])
         except pytz.exceptions.UnknownTimeZoneError:
-            logger.error(f"Invalid timezone: {env_config['timezone']}")
+            logger.error("Invalid timezone: %s", env_config['timezone'])
             raise ValueError(f"Invalid timezone: {env_config['timezone']}")
 
         logger.info("Configuration loaded successfully")
         return Config(**env_config)
     except (ValidationError, ValueError, json.JSONDecodeError) as e:
-        logger.error(f"Configuration error: {str(e)}")
+        logger.error("Configuration error: %s", e)
         raise
 
 # Trigger Apps Script
@@ -186,10 +179,10 @@ def trigger_apps_script(config: Config, logger: logging.Logger, message: str) ->
         payload = {"message": message}
         response = requests.post(config.apps_script_url, json=payload, timeout=10)
         response.raise_for_status()
-        logger.info(f"Successfully triggered Apps Script: {response.text}")
+        logger.info("Successfully triggered Apps Script: %s", response.text)
         return True
     except requests.RequestException as e:
-        logger.error(f"Failed to trigger Apps Script: {str(e)}")
+        logger.error("Failed to trigger Apps Script: %s", e)
         return False
 
 # Added: Trigger WhatsApp notification
@@ -202,10 +195,10 @@ def trigger_whatsapp_notification(config: Config, logger: logging.Logger, messag
         payload = {"number": config.whatsapp_number, "message": message}
         response = requests.post(config.whatsapp_api_url, json=payload, timeout=10)
         response.raise_for_status()
-        logger.info(f"Successfully sent WhatsApp notification: {response.text}")
+        logger.info("Successfully sent WhatsApp notification: %s", response.text)
         return True
     except requests.RequestException as e:
-        logger.error(f"Failed to send WhatsApp notification: {str(e)}")
+        logger.error("Failed to send WhatsApp notification: %s", e)
         return False
 
 class ShinobiAPI:
@@ -214,54 +207,47 @@ class ShinobiAPI:
         self.logger = logger
         self.base_url = f"http://{config.shinobi_host}:{config.shinobi_port}/{config.api_key}"
         self.session = self._create_session()
+        self._monitors_url = f"{self.base_url}/monitor/{config.group_key}"
 
     def _create_session(self) -> requests.Session:
         session = requests.Session()
         retries = Retry(
             total=self.config.max_retries,
             backoff_factor=self.config.retry_backoff_factor,
-            status_forcelist=[429, 500, 502, 503, 504]
+            status_forcelist=[429, 500, 502, 503, 504],
+            raise_on_status=False
         )
-        adapter = HTTPAdapter(max_retries=retries)
+        adapter = HTTPAdapter(max_retries=retries, pool_connections=1, pool_maxsize=1)
         session.mount("http://", adapter)
         session.mount("https://", adapter)
         return session
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def get_all_monitors(self) -> Optional[List[Dict[str, Any]]]:
-        endpoint = f"monitor/{self.config.group_key}"
+    # Fetch the monitor list once and classify server health from the same response
+    def poll(self) -> Tuple[str, Optional[List[Dict[str, Any]]]]:
         try:
-            resp = self.session.get(f"{self.base_url}/{endpoint}", timeout=10)
-            resp.raise_for_status()
-            data = resp.json()
+            resp = self.session.get(self._monitors_url, timeout=10)
+            if resp.status_code >= 400:
+                self.logger.warning("Shinobi server health check failed: HTTP %s", resp.status_code)
+                return "ERROR", None
+            data = orjson.loads(resp.content)
             if isinstance(data, dict) and not data.get("ok"):
-                self.logger.error(f"API error: {data.get('msg', 'Unknown error')}")
-                return None
-            return data
-        except requests.RequestException as e:
-            self.logger.error(f"Request error: {str(e)}")
-            return None
-
-    def health_check(self) -> str:
-        endpoint = f"monitor/{self.config.group_key}"
-        try:
-            resp = self.session.get(f"{self.base_url}/{endpoint}", timeout=5)
-            resp.raise_for_status()
-            data = resp.json()
-            if isinstance(data, dict) and not data.get("ok"):
-                self.logger.warning(f"Shinobi server responded but with error: {data.get('msg', 'Unknown error')}")
-                return "INVALID_RESPONSE"
+                self.logger.warning("Shinobi server responded but with error: %s", data.get('msg', 'Unknown error'))
+                return "INVALID_RESPONSE", None
             self.logger.debug("Shinobi server health check: OK")
-            return "OK"
+            return "OK", data
         except requests.ConnectionError:
             self.logger.warning("Shinobi server is unreachable (connection error)")
-            return "UNREACHABLE"
+            return "UNREACHABLE", None
         except requests.Timeout:
             self.logger.warning("Shinobi server health check timed out")
-            return "TIMEOUT"
-        except requests.RequestException as e:
-            self.logger.warning(f"Shinobi server health check failed: {str(e)}")
-            return "ERROR"
+            return "TIMEOUT", None
+        except (requests.RequestException, orjson.JSONDecodeError) as e:
+            self.logger.warning("Shinobi server health check failed: %s", e)
+            return "ERROR", None
+
+# Rows are written to Google Sheets in batches: when this many are queued or the oldest has waited FLUSH_INTERVAL seconds
+SHEETS_BATCH_SIZE = 10
+SHEETS_FLUSH_INTERVAL = 600.0
 
 class GoogleSheetsClient:
     def __init__(self, config: Config, logger: logging.Logger):
@@ -269,54 +255,118 @@ class GoogleSheetsClient:
         self.logger = logger
         self.client: Optional[Client] = None
         self.sheet: Optional[Worksheet] = None
+        self._pending: List[List[Any]] = []
+        self._last_flush = time.monotonic()
+        self._creds: Optional[ServiceAccountCredentials] = None
+        self._creds_mtime: Optional[float] = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sheets-writer")
+        self._inflight: Optional[Future] = None
         self._initialize_client()
 
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     def _initialize_client(self) -> None:
         try:
             if not os.path.exists(self.config.credentials_file):
-                self.logger.error(f"Credentials file not found: {self.config.credentials_file}")
+                self.logger.error("Credentials file not found: %s", self.config.credentials_file)
                 raise FileNotFoundError(f"Credentials file not found: {self.config.credentials_file}")
             
-            creds = ServiceAccountCredentials.from_json_keyfile_name(
-                self.config.credentials_file, self.config.scopes
-            )
-            self.client = gspread.authorize(creds) 
+            # Only re-read and re-parse the keyfile when it has changed on disk
+            mtime = os.path.getmtime(self.config.credentials_file)
+            if self._creds is None or self._creds_mtime != mtime:
+                self._creds = ServiceAccountCredentials.from_service_account_file(
+                    self.config.credentials_file, scopes=self.config.scopes
+                )
+                self._creds_mtime = mtime
+            self.client = gspread.authorize(self._creds)
             self.sheet = self.client.open_by_key(self.config.sheet_id).sheet1
         except Exception as e:
-            self.logger.error(f"Failed to initialize Google Sheets client: {str(e)}")
+            self.logger.error("Failed to initialize Google Sheets client: %s", e)
             self.client = None
             self.sheet = None
             raise
 
     def append_row(self, row: List[Any]) -> bool:
+        self._pending.append(row)
+        return self.flush()
+
+    def flush(self, force: bool = False) -> bool:
+        if force and self._inflight is not None:
+            self._inflight.result()  # Shutdown: let the batch in flight finish (or re-queue its rows) first
+        with self._lock:
+            if not self._pending:
+                return True
+            if not force and len(self._pending) < SHEETS_BATCH_SIZE \
+                    and time.monotonic() - self._last_flush < SHEETS_FLUSH_INTERVAL:
+                return True
+            if not force and self._inflight is not None and not self._inflight.done():
+                return True  # Previous batch is still being written; these rows go out with the next one
+            rows, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+        if force:
+            return self._write_rows(rows)
+        # Write in the background so Sheets latency and retries don't delay the next poll
+        self._inflight = self._executor.submit(self._write_rows, rows)
+        return True
+
+    def _requeue(self, rows: List[List[Any]]) -> None:
+        with self._lock:
+            self._pending[:0] = rows
+
+    def _write_rows(self, rows: List[List[Any]]) -> bool:
         if self.sheet is None:
-            self.logger.error("Google Sheets client not initialized")
-            return False
+            # A failed re-authorization leaves no sheet; try again rather than dropping every later flush
+            try:
+                self._initialize_client()
+            except Exception:
+                self.logger.error("Google Sheets client not initialized")
+                self._requeue(rows)
+                return False
         for attempt in range(self.config.max_retries):
             try:
-                self.sheet.append_row(row) 
+                self.sheet.append_rows(rows, value_input_option="RAW", insert_data_option="INSERT_ROWS")
                 return True
             except Exception as e:
-                self.logger.warning(f"Failed to append row on attempt {attempt + 1}: {str(e)}")
+                self.logger.warning("Failed to append rows on attempt %s: %s", attempt + 1, e)
+                if isinstance(e, gspread.exceptions.APIError) and e.response.status_code == 401:
+                    # Token was rejected; refresh it in place, and only rebuild the client if that fails
+                    try:
+                        self._creds.refresh(GoogleAuthRequest())
+                    except Exception:
+                        try:
+                            self._initialize_client()
+                        except Exception:
+                            self._requeue(rows)
+                            return False
+                    continue
                 time.sleep(self.config.retry_backoff_factor * (2 ** attempt))
-        self.logger.error("Max retries reached for appending to Google Sheet")
+        self.logger.error("Max retries reached for appending to Google Sheet; rows kept for the next flush")
+        self._requeue(rows)
         return False
 
-def process_monitors(monitors_data: Optional[List[Dict[str, Any]]], config: Config, logger: logging.Logger) -> Dict[str, Any]:
+# Metrics written to each Google Sheets row, in column order
+SHEET_COLUMNS = ("date", "time", "total_cameras", "recording", "percentage_recording", "threshold_met")
+
+# Timestamp formats for the metrics row and the saved file name
+DATE_FMT = "%Y-%m-%d"
+TIME_FMT = "%H:%M:%S"
+FILE_FMT = "%Y%m%d_%H%M%S"
+
+def process_monitors(monitors_data: Optional[List[Dict[str, Any]]], config: Config, logger: logging.Logger, now: Optional[datetime] = None) -> Dict[str, Any]:
     if not monitors_data or not isinstance(monitors_data, list):
         logger.error("Invalid or no monitor data received")
         return {"monitors": [], "metrics": {}}
 
-    logger.debug(f"Processing monitors: {monitors_data}")
-    logger.debug(f"Configured monitor IDs: {config.monitor_ids}")
+    logger.debug("Processing monitors: %s", monitors_data)
+    logger.debug("Configured monitor IDs: %s", config.monitor_ids)
 
+    monitor_id_set = config._monitor_id_set
     seen_ids = set()
     monitor_statuses = []
     for monitor in monitors_data:
         monitor_id = monitor.get("mid")
-        logger.debug(f"Checking monitor ID: {monitor_id}")
-        if monitor_id in config.monitor_ids and monitor_id not in seen_ids:
+        logger.debug("Checking monitor ID: %s", monitor_id)
+        if monitor_id in monitor_id_set and monitor_id not in seen_ids:
             seen_ids.add(monitor_id)
             operational = monitor.get("mode") == "record" and monitor.get("status") == "Recording"
             status = {
@@ -328,9 +378,9 @@ def process_monitors(monitors_data: Optional[List[Dict[str, Any]]], config: Conf
                 "status": monitor.get("status", "Unknown")
             }
             monitor_statuses.append(status)
-            logger.debug(f"Monitor status: {status}")
-            if not operational:
-                logger.debug(json.dumps({
+            logger.debug("Monitor status: %s", status)
+            if not operational and logger.isEnabledFor(logging.DEBUG):
+                logger.debug(orjson.dumps({
                     "monitor_id": status["id"],
                     "name": status["name"],
                     "recording": status["recording"],
@@ -338,11 +388,14 @@ def process_monitors(monitors_data: Optional[List[Dict[str, Any]]], config: Conf
                     "mode": status["mode"],
                     "status": status["status"],
                     "message": "Monitor not operational"
-                }))
+                }).decode())
+            if len(seen_ids) == len(monitor_id_set):
+                break  # Every configured monitor found; skip the rest of the list
 
-    missing_monitors = [mid for mid in config.monitor_ids if mid not in seen_ids]
+    missing_ids = monitor_id_set.difference(seen_ids)
+    missing_monitors = [mid for mid in config.monitor_ids if mid in missing_ids] if missing_ids else []
     if missing_monitors:
-        logger.warning(f"Missing monitors: {missing_monitors}")
+        logger.warning("Missing monitors: %s", missing_monitors)
 
     total_cameras = len(config.monitor_ids)
     recording_count = sum(1 for status in monitor_statuses if status["operational"])
@@ -350,12 +403,11 @@ def process_monitors(monitors_data: Optional[List[Dict[str, Any]]], config: Conf
     if total_cameras > 0:
         percentage_recording = round((recording_count / total_cameras) * 100, 2)
     
-    tz = pytz.timezone(config.timezone)
-    now_utc = datetime.now(pytz.utc)
-    now_local = now_utc.astimezone(tz)
+    if now is None:
+        now = datetime.now(pytz.timezone(config.timezone))
     metrics = {
-        "date": now_local.strftime("%Y-%m-%d"),
-        "time": now_local.strftime("%H:%M:%S"),
+        "date": now.strftime(DATE_FMT),
+        "time": now.strftime(TIME_FMT),
         "total_cameras": total_cameras,
         "recording": recording_count,
         "not_recording": total_cameras - recording_count,
@@ -363,32 +415,61 @@ def process_monitors(monitors_data: Optional[List[Dict[str, Any]]], config: Conf
         "threshold_met": "Yes" if percentage_recording >= 75.0 else "No"
     }
 
-    logger.debug(f"Processed metrics: {metrics}")
+    logger.debug("Processed metrics: %s", metrics)
     return {"monitors": monitor_statuses, "metrics": metrics, "missing_monitors": missing_monitors}
 
-def save_metrics(metrics: Dict[str, Any], config: Config, logger: logging.Logger) -> str:
+# Saved metrics files as (mtime, path), oldest first; scanned from disk once so cleanup needn't list the directory every cycle
+def load_saved_files(output_dir: str) -> Deque[Tuple[float, str]]:
+    files = []
+    if os.path.isdir(output_dir):
+        for entry in os.scandir(output_dir):
+            if entry.name.startswith("monitor_data_") and entry.name.endswith(".json"):
+                files.append((entry.stat().st_mtime, entry.path))
+    return deque(sorted(files))
+
+def save_metrics(metrics: Dict[str, Any], config: Config, logger: logging.Logger, now: Optional[datetime] = None,
+                 saved_files: Optional[Deque[Tuple[float, str]]] = None) -> str:
     try:
         os.makedirs(config.output_dir, exist_ok=True)
-        timestamp = datetime.now(pytz.timezone(config.timezone)).strftime("%Y%m%d_%H%M%S")
+        if now is None:
+            now = datetime.now(pytz.timezone(config.timezone))
+        timestamp = now.strftime(FILE_FMT)
         output_path = os.path.normpath(os.path.join(config.output_dir, f"monitor_data_{timestamp}.json"))
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(metrics, f, indent=2)
+        payload = orjson.dumps(metrics, option=orjson.OPT_INDENT_2 if config.pretty_metrics else 0)
+        # Write to a temp file and swap it in, so a crash never leaves a half-written metrics file
+        tmp_path = output_path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, output_path)
+        except Exception:
+            # Retention only matches .json files, so a leftover temp file would never be cleaned up
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
         
+        if saved_files is None:
+            saved_files = load_saved_files(config.output_dir)
+        else:
+            saved_files.append((time.time(), output_path))
+
         # Clean up old log files
         cutoff_time = time.time() - (config.log_retention_days * 86400)
-        for filename in os.listdir(config.output_dir):
-            if filename.startswith("monitor_data_") and filename.endswith(".json"):
-                file_path = os.path.join(config.output_dir, filename)
-                if os.path.getmtime(file_path) < cutoff_time:
-                    try:
-                        os.remove(file_path)
-                        logger.debug(f"Deleted old log file: {file_path}")
-                    except Exception as e:
-                        logger.warning(f"Failed to delete old log file {file_path}: {str(e)}")
+        while saved_files and saved_files[0][0] < cutoff_time:
+            _, file_path = saved_files.popleft()
+            try:
+                os.remove(file_path)
+                logger.debug("Deleted old log file: %s", file_path)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning("Failed to delete old log file %s: %s", file_path, e)
         
         return output_path
     except Exception as e:
-        logger.error(f"Failed to save metrics to {output_path}: {str(e)}")
+        logger.error("Failed to save metrics to %s: %s", output_path, e)
         return ""
 
 def print_metrics(data: Dict[str, Any]) -> None:
@@ -412,16 +493,18 @@ def main() -> None:
     try:
         config = load_config()
     except Exception as e:
-        logging.getLogger(__name__).error(f"Failed to load configuration: {str(e)}")
+        logging.getLogger(__name__).error("Failed to load configuration: %s", e)
         print(f"Error: Failed to load configuration: {e}")
         return
 
     logger = setup_logging(config.timezone)
     logger.info("Shinobi Monitor Script started")
-    logger.info(f"Configuration loaded: {config.dict(exclude={'api_key', 'credentials_file'})}")
+    logger.info("Configuration loaded: %s", config.dict(exclude={'api_key', 'credentials_file'}))
 
     api = ShinobiAPI(config, logger)
     sheets_client = GoogleSheetsClient(config, logger)
+    tz = pytz.timezone(config.timezone)
+    saved_files = load_saved_files(config.output_dir)
     shutdown = False
     consecutive_failures = 0
     last_notification_time = 0.0
@@ -436,100 +519,72 @@ def main() -> None:
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
 
-    while not shutdown:
-        try:
-            start_time = time.time()
-            server_status = api.health_check()
-            print(f"Shinobi Server Status: {server_status}")
-            logger.info(f"Shinobi Server Status: {server_status}")
-
-            current_time = time.time()
-            if server_status != "OK":
-                consecutive_failures += 1
-                # Send notification on first failure or after cooldown
-                if server_was_up or (current_time - last_notification_time) >= config.notification_cooldown:
-                    message = f"Shinobi server at {config.shinobi_host}:{config.shinobi_port} is down (Status: {server_status}). Please check the server."
-                    trigger_apps_script(config, logger, message)
-                    trigger_whatsapp_notification(config, logger, message)
-                    last_notification_time = current_time
-                server_was_up = False
-                logger.warning(f"Shinobi server check failed (attempt {consecutive_failures}/{config.max_consecutive_failures})")
-                if consecutive_failures >= config.max_consecutive_failures:
-                    error_msg = f"Shinobi server unreachable after {config.max_consecutive_failures} attempts. Exiting script."
-                    logger.error(error_msg)
-                    print(f"Error: {error_msg}")
-                    trigger_apps_script(config, logger, error_msg)
-                    trigger_whatsapp_notification(config, logger, error_msg)
-                    sys.exit(1)
-                time.sleep(config.update_interval)
-                continue
-
-            consecutive_failures = 0
-            server_was_up = True
-
-            monitors_data = api.get_all_monitors()
-            if monitors_data is None:
-                logger.error("Failed to fetch monitor data from Shinobi API")
-                consecutive_failures += 1
-                if consecutive_failures >= config.max_consecutive_failures:
-                    error_msg = f"Shinobi server data fetch failed after {config.max_consecutive_failures} attempts. Exiting script."
-                    logger.error(error_msg)
-                    print(f"Error: {error_msg}")
-                    trigger_apps_script(config, logger, error_msg)
-                    trigger_whatsapp_notification(config, logger, error_msg)
-                    sys.exit(1)
-                time.sleep(config.update_interval)
-                continue
-
-            processed_data = process_monitors(monitors_data, config, logger)
+    # Cycles start on a fixed monotonic cadence; a cycle that overruns starts the next one immediately instead of piling up
+    next_tick = time.monotonic()
+
+    def sleep_until_next_tick() -> None:
+        nonlocal next_tick
+        next_tick = max(next_tick + config.update_interval, time.monotonic())
+        time.sleep(max(0.0, next_tick - time.monotonic()))
+
+    try:
+        while not shutdown:
+            try:
+                server_status, monitors_data = api.poll()  # Health check and monitor list from one request
+                print(f"Shinobi Server Status: {server_status}")
+                logger.info("Shinobi Server Status: %s", server_status)
+
+                current_time = time.time()
+                if server_status != "OK":
+                    consecutive_failures += 1
+                    # Send notification on first failure or after cooldown
+                    if server_was_up or (current_time - last_notification_time) >= config.notification_cooldown:
+                        message = f"Shinobi server at {config.shinobi_host}:{config.shinobi_port} is down (Status: {server_status}). Please check the server."
+                        trigger_apps_script(config, logger, message)
+                        trigger_whatsapp_notification(config, logger, message)
+                        last_notification_time = current_time
+                    server_was_up = False
+                    logger.warning("Shinobi server check failed (attempt %s/%s)", consecutive_failures, config.max_consecutive_failures)
+                    if consecutive_failures >= config.max_consecutive_failures:
+                        error_msg = f"Shinobi server unreachable after {config.max_consecutive_failures} attempts. Exiting script."
+                        logger.error(error_msg)
+                        print(f"Error: {error_msg}")
+                        trigger_apps_script(config, logger, error_msg)
+                        trigger_whatsapp_notification(config, logger, error_msg)
+                        sys.exit(1)
+                    sleep_until_next_tick()
+                    continue
+
+                consecutive_failures = 0
+                server_was_up = True
+
+                # One clock read per cycle, shared by the metrics row and the saved file name
+                now = datetime.now(tz)
+                processed_data = process_monitors(monitors_data, config, logger, now)
             
-            if processed_data["metrics"]:
-                save_metrics(processed_data, config, logger)
-                if not sheets_client.append_row([
-                    processed_data["metrics"]["date"],
-                    processed_data["metrics"]["time"],
-                    processed_data["metrics"]["total_cameras"],
-                    processed_data["metrics"]["recording"],
-                    processed_data["metrics"]["percentage_recording"],
-                    processed_data["metrics"]["threshold_met"]
-                ]):
-                    logger.error("Failed to append row to Google Sheets")
-                print_metrics(processed_data)
+                metrics = processed_data["metrics"]
+                if metrics:
+                    save_metrics(processed_data, config, logger, now, saved_files)
+                    if not sheets_client.append_row([metrics[column] for column in SHEET_COLUMNS]):
+                        logger.error("Failed to append row to Google Sheets")
+                    print_metrics(processed_data)
                 
-                # Send notification if threshold not met
-                if processed_data["metrics"]["threshold_met"] == "No" and (threshold_was_met or (current_time - last_notification_time) >= config.notification_cooldown):
-                    message = f"Camera recording threshold not met: {processed_data['metrics']['percentage_recording']}% (Recording: {processed_data['metrics']['recording']}/{processed_data['metrics']['total_cameras']})."
-                    trigger_apps_script(config, logger, message)
-                    trigger_whatsapp_notification(config, logger, message)
-                    last_notification_time = current_time
-                    threshold_was_met = False
-                elif processed_data["metrics"]["threshold_met"] == "Yes":
-                    threshold_was_met = True
+                    # Send notification if threshold not met
+                    if metrics["threshold_met"] == "No" and (threshold_was_met or (current_time - last_notification_time) >= config.notification_cooldown):
+                        message = f"Camera recording threshold not met: {metrics['percentage_recording']}% (Recording: {metrics['recording']}/{metrics['total_cameras']})."
+                        trigger_apps_script(config, logger, message)
+                        trigger_whatsapp_notification(config, logger, message)
+                        last_notification_time = current_time
+                        threshold_was_met = False
+                    elif metrics["threshold_met"] == "Yes":
+                        threshold_was_met = True
             
-            elapsed_time = time.time() - start_time
-            sleep_time = max(config.update_interval - elapsed_time, 0)
-            time.sleep(sleep_time)
-        except requests.RequestException as e:
-            logger.error(f"Network error while fetching data: {str(e)}")
-            consecutive_failures += 1
-            current_time = time.time()
-            if server_was_up or (current_time - last_notification_time) >= config.notification_cooldown:
-                message = f"Shinobi server at {config.shinobi_host}:{config.shinobi_port} is down (Network error: {str(e)}). Please check the server."
-                trigger_apps_script(config, logger, message)
-                trigger_whatsapp_notification(config, logger, message)
-                last_notification_time = current_time
-                server_was_up = False
-            if consecutive_failures >= config.max_consecutive_failures:
-                error_msg = f"Shinobi server unreachable after {config.max_consecutive_failures} attempts. Exiting script."
-                logger.error(error_msg)
-                print(f"Error: {error_msg}")
-                trigger_apps_script(config, logger, error_msg)
-                trigger_whatsapp_notification(config, logger, error_msg)
-                sys.exit(1)
-            time.sleep(config.update_interval)
-        except Exception as e:
-            logger.error(f"Unexpected error in main loop: {str(e)}")
-            time.sleep(config.update_interval)
+                sleep_until_next_tick()
+            except Exception as e:
+                logger.error("Unexpected error in main loop: %s", e)
+                sleep_until_next_tick()
+    finally:
+        sheets_client.flush(force=True)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file